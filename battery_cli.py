@@ -28,15 +28,29 @@ class Colors:
     RESET = '\033[0m'
 
 
+# Bar glyph runs, sliced per call instead of rebuilt with str * int
+_BAR_FULL = '█' * 101
+_BAR_EMPTY = '░' * 101
+
+# Every 0-100% bar at the default width, keyed by (width, filled, color)
+_BAR_WIDTH = 20
+_BAR_CACHE = {
+    (_BAR_WIDTH, filled, color):
+        f"{color}{_BAR_FULL[:filled]}{_BAR_EMPTY[:_BAR_WIDTH - filled]}{Colors.RESET}"
+    for filled in range(_BAR_WIDTH + 1)
+    for color in (Colors.RED, Colors.YELLOW, Colors.GREEN)
+}
+
+
 def colored(text: str, color: str) -> str:
     """Apply ANSI color to text."""
     return f"{color}{text}{Colors.RESET}"
 
 
-def format_percentage_bar(pct: float, width: int = 20) -> str:
+def format_percentage_bar(pct: float, width: int = _BAR_WIDTH) -> str:
     """Create a visual percentage bar."""
     filled = int(pct / 100 * width)
-    empty = width - filled
+    empty = max(width - filled, 0)
     
     if pct > 50:
         color = Colors.GREEN
@@ -45,14 +59,17 @@ def format_percentage_bar(pct: float, width: int = 20) -> str:
     else:
         color = Colors.RED
     
-    bar = f"{color}{'█' * filled}{'░' * empty}{Colors.RESET}"
+    bar = _BAR_CACHE.get((width, filled, color))
+    if bar is None:
+        bar = f"{color}{_BAR_FULL[:filled]}{_BAR_EMPTY[:empty]}{Colors.RESET}"
     return f"[{bar}] {pct:.1f}%"
 
 
 def cmd_status(db: BatteryDatabase, args):
     """Show current battery status."""
     print(colored("\n⚡ Current Battery Status", Colors.BOLD + Colors.CYAN))
-    print("─" * 50)
+    # stdout is block-buffered; show the header before collection starts
+    print("─" * 50, flush=True)
     
     snapshot = collect_battery_snapshot()
     
@@ -114,24 +131,26 @@ def cmd_stats(db: BatteryDatabase, args):
         print(f"\n📅 Daily Breakdown:")
         print(f"   {'Date':<12} {'Min%':>6} {'Max%':>6} {'Avg W':>7} {'Samples':>8}")
         print("   " + "-" * 45)
-        for day in daily[:10]:
-            avg_w = day['avg_wattage'] or 0
-            print(f"   {day['date']:<12} {day['min_percentage']:>5}% "
-                  f"{day['max_percentage']:>5}% {avg_w:>6.1f}W "
-                  f"{day['sample_count']:>8}")
+        print("\n".join(
+            f"   {day['date']:<12} {day['min_percentage']:>5}% "
+            f"{day['max_percentage']:>5}% {day['avg_wattage'] or 0:>6.1f}W "
+            f"{day['sample_count']:>8}"
+            for day in daily[:10]
+        ))
     
     # Drain patterns by hour
-    patterns = db.get_drain_patterns()
+    patterns = db.get_drain_patterns(args.days)
     if patterns:
         print(f"\n⏰ Hourly Drain Patterns:")
         print(f"   {'Hour':>6} {'Avg Drain':>12} {'Avg Power':>12} {'Samples':>10}")
         print("   " + "-" * 45)
-        for p in patterns:
-            if p['samples'] > 5:
-                drain = abs(p['avg_drain_per_sample'] or 0)
-                avg_w = p['avg_wattage'] or 0
-                print(f"   {p['hour']:>4}:00 {drain:>10.2f}%/h "
-                      f"{avg_w:>10.1f}W {p['samples']:>10}")
+        rows = [
+            f"   {p['hour']:>4}:00 {abs(p['avg_drain_per_sample'] or 0):>10.2f}%/h "
+            f"{p['avg_wattage'] or 0:>10.1f}W {p['samples']:>10}"
+            for p in patterns if p['samples'] > 5
+        ]
+        if rows:
+            print("\n".join(rows))
     
     print()
 
@@ -145,11 +164,13 @@ def cmd_apps(db: BatteryDatabase, args):
     if apps:
         print(f"\n{'App':<30} {'Times Active':>12} {'Avg Power':>10}")
         print("-" * 55)
+        rows = []
         for app in apps[:15]:
             wattage = app['avg_wattage_when_active'] or 0
             color = Colors.RED if wattage > 15 else Colors.YELLOW if wattage > 8 else Colors.GREEN
-            print(f"{app['app_name']:<30} {app['frequency']:>12} "
-                  f"{colored(f'{wattage:>8.1f}W', color)}")
+            rows.append(f"{app['app_name']:<30} {app['frequency']:>12} "
+                        f"{colored(f'{wattage:>8.1f}W', color)}")
+        print("\n".join(rows))
     else:
         print("\nNo app data available yet. Run the monitor for a while first.")
     
@@ -159,8 +180,10 @@ def cmd_apps(db: BatteryDatabase, args):
         print(f"\n⚠️  Apps Preventing Sleep:")
         print(f"   {'Process':<25} {'Type':<20} {'Frequency':>10}")
         print("   " + "-" * 55)
-        for a in assertions[:10]:
-            print(f"   {a['process']:<25} {a['assertion_type']:<20} {a['frequency']:>10}")
+        print("\n".join(
+            f"   {a['process']:<25} {a['assertion_type']:<20} {a['frequency']:>10}"
+            for a in assertions[:10]
+        ))
     
     print()
 
@@ -174,6 +197,7 @@ def cmd_sessions(db: BatteryDatabase, args):
     if sessions:
         print(f"\n{'Start':<20} {'Duration':>10} {'Drain':>8} {'Rate':>10} {'Avg Power':>10}")
         print("-" * 65)
+        rows = []
         for s in sessions[:20]:
             start = s['start_time'][:16].replace('T', ' ')
             duration = f"{s['duration_minutes']}m" if s['duration_minutes'] else "?"
@@ -182,8 +206,9 @@ def cmd_sessions(db: BatteryDatabase, args):
             power = f"{s['avg_wattage']:.1f}W" if s['avg_wattage'] else "?"
             
             color = Colors.RED if (s['drain_rate_per_hour'] or 0) > 20 else Colors.GREEN
-            print(f"{start:<20} {duration:>10} {drain:>8} "
-                  f"{colored(rate, color):>18} {power:>10}")
+            rows.append(f"{start:<20} {duration:>10} {drain:>8} "
+                        f"{colored(rate, color):>18} {power:>10}")
+        print("\n".join(rows))
     else:
         print("\nNo discharge sessions recorded yet.")
     
@@ -206,12 +231,13 @@ def cmd_history(db: BatteryDatabase, args):
     if snapshots:
         print(f"\n{'Time':<20} {'%':>5} {'Power':>8} {'Temp':>7} {'CPU':>6} {'Status':>10}")
         print("-" * 65)
-        for s in snapshots[-30:]:  # Last 30
-            time_str = s['timestamp'][11:19]
-            status = "⚡Charge" if s['is_charging'] else "🔋Drain"
-            print(f"{s['timestamp'][:10]} {time_str} {s['percentage']:>4}% "
-                  f"{s['wattage']:>6.1f}W {s['temperature_celsius']:>5.1f}°C "
-                  f"{s['cpu_usage_percent']:>5.1f}% {status:>10}")
+        print("\n".join(
+            f"{s['timestamp'][:10]} {s['timestamp'][11:19]} {s['percentage']:>4}% "
+            f"{s['wattage']:>6.1f}W {s['temperature_celsius']:>5.1f}°C "
+            f"{s['cpu_usage_percent']:>5.1f}% "
+            f"{'⚡Charge' if s['is_charging'] else '🔋Drain':>10}"
+            for s in snapshots[-30:]  # Last 30
+        ))
     else:
         print("\nNo history available yet. Start the daemon to collect data.")
     
@@ -221,7 +247,7 @@ def cmd_history(db: BatteryDatabase, args):
 def cmd_health(db: BatteryDatabase, args):
     """Show battery health analysis."""
     print(colored("\n🏥 Battery Health Analysis", Colors.BOLD + Colors.CYAN))
-    print("─" * 50)
+    print("─" * 50, flush=True)
     
     snapshot = collect_battery_snapshot()
     summary = db.get_summary_stats()
@@ -278,7 +304,7 @@ def cmd_import_history(db: BatteryDatabase, args):
     print(colored("\n📥 Importing Historical Battery Data", Colors.BOLD + Colors.CYAN))
     print("─" * 50)
 
-    print("\nParsing pmset log...")
+    print("\nParsing pmset log...", flush=True)
     events = parse_pmset_log()
 
     if not events:
@@ -291,7 +317,7 @@ def cmd_import_history(db: BatteryDatabase, args):
     if events:
         first_ts = events[0]['timestamp'][:10]
         last_ts = events[-1]['timestamp'][:10]
-        print(f"Date range: {first_ts} to {last_ts}")
+        print(f"Date range: {first_ts} to {last_ts}", flush=True)
 
     if not args.yes:
         confirm = input("\nImport these events? [y/N]: ")
@@ -374,6 +400,12 @@ Examples:
     if not args.command:
         args.command = 'status'
     
+    # stdout is line-buffered on a terminal, which turns every print() of
+    # the reports below into its own write(); flush in blocks instead.
+    # input() and interpreter exit still flush pending output; progress
+    # lines printed before slow work pass flush=True.
+    sys.stdout.reconfigure(line_buffering=False)
+    
     db = BatteryDatabase()
     
     commands = {
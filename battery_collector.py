@@ -4,12 +4,63 @@ Battery Data Collector for macOS
 Collects comprehensive battery metrics using native macOS commands.
 """
 
+import ctypes
+import os
 import subprocess
 import re
 import json
-from datetime import datetime
-from dataclasses import dataclass, asdict
-from typing import Optional, Dict, Any, List
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from dataclasses import dataclass, fields
+from functools import lru_cache
+from typing import Optional, Callable, Dict, Any, Iterator, List
+
+try:
+    import psutil
+except ImportError:  # stdlib-only installs sample CPU with `top` instead
+    psutil = None
+
+
+# Executable prefixes that identify user-facing applications
+_APP_DIRECTORIES = ('/Applications/', '/System/Applications/')
+
+# ioreg keys read by the collector; slow ones change over hours, not minutes
+_IOREG_KEYS = frozenset({
+    'CycleCount', 'DesignCapacity', 'MaxCapacity', 'AppleRawMaxCapacity',
+    'NominalChargeCapacity', 'CurrentCapacity', 'AppleRawCurrentCapacity',
+    'Voltage', 'Amperage', 'Temperature', 'IsCharging', 'ExternalConnected',
+    'TimeRemaining',
+})
+_SLOW_IOREG_KEYS = frozenset({
+    'CycleCount', 'DesignCapacity', 'MaxCapacity', 'AppleRawMaxCapacity',
+    'NominalChargeCapacity',
+})
+_SLOW_FIELDS_TTL_SECONDS = 300
+
+# ioreg TimeRemaining while macOS is still calculating an estimate
+_NO_TIME_ESTIMATE = 65535
+
+# Snapshots taken within this window are shared between callers
+_SNAPSHOT_TTL_SECONDS = 2
+
+# Shortest CPU sampling window psutil gives a meaningful reading for
+_MIN_CPU_SAMPLE_SECONDS = 0.1
+
+# Patterns are compiled once at import; the collector runs them every snapshot
+_POWER_DETAILS_RE = re.compile(r'"PowerOutDetails"\s*=\s*\([^)]*"Watts"\s*=\s*(\d+)')
+_CPU_RE = re.compile(r'(\d+\.?\d*)% user.*?(\d+\.?\d*)% sys')
+_BRIGHTNESS_RE = re.compile(r'brightness\s+(\d+\.?\d*)')
+_ASSERTION_RE = re.compile(r'pid (\d+)\(([^)]+)\):\s*\[([^\]]+)\]\s*(\d+:\d+:\d+)\s+(.+)')
+
+# Format: 2025-12-30 20:08:05 -0500 Sleep  Entering Sleep... Using Batt (Charge:99%)
+_PMSET_LOG_RE = re.compile(
+    r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\s+[+-]\d{4})\s+'  # Timestamp with TZ
+    r'(\w+)\s+'  # Event type (Sleep, Wake, DarkWake, Assertions, etc.)
+    r'.*?'  # Message content
+    r'Using\s+(Batt|AC|BATT)'  # Power source
+    r'.*?\(Charge:\s*(\d+)%?\)'  # Battery percentage
+)
 
 
 @dataclass
@@ -45,17 +96,63 @@ class BatterySnapshot:
     power_assertions: List[Dict[str, str]]
 
 
-def run_command(cmd: str) -> str:
-    """Execute a shell command and return output."""
+_SNAPSHOT_FIELDS = fields(BatterySnapshot)
+
+
+class _SlowFieldCache:
+    """Remembers slow-changing ioreg fields between snapshots."""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl = ttl_seconds
+        self.values: Dict[str, Any] = {}
+        self.expires_at = 0.0
+
+    def get(self) -> Dict[str, Any]:
+        """Return the cached fields, or an empty dict once they expire."""
+        if time.monotonic() < self.expires_at:
+            return self.values
+        return {}
+
+    def update(self, ioreg: Dict[str, Any]):
+        """Cache the slow fields from a freshly parsed ioreg dict."""
+        self.values = {k: v for k, v in ioreg.items() if k in _SLOW_IOREG_KEYS}
+        self.expires_at = time.monotonic() + self.ttl
+
+
+_slow_fields = _SlowFieldCache(_SLOW_FIELDS_TTL_SECONDS)
+
+if psutil is not None:
+    # The first cpu_percent() call only establishes the baseline
+    psutil.cpu_percent(interval=None)
+    _cpu_sampled_at = time.monotonic()
+
+
+def run_command(argv: List[str]) -> str:
+    """Execute a command (without a shell) and return its output."""
     try:
         result = subprocess.run(
-            cmd, shell=True, capture_output=True, text=True, timeout=10
+            argv, capture_output=True, text=True, timeout=10
         )
         return result.stdout
     except subprocess.TimeoutExpired:
         return ""
     except subprocess.SubprocessError:
         return ""
+    except OSError:  # Command not installed
+        return ""
+
+
+def stream_command(argv: List[str]) -> Iterator[str]:
+    """Yield a command's output line by line while it is still running."""
+    try:
+        proc = subprocess.Popen(
+            argv, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+            text=True, bufsize=1 << 16
+        )
+    except OSError:
+        return
+    with proc:
+        yield from proc.stdout
 
 
 def convert_signed_int64(value: int) -> int:
@@ -67,109 +164,147 @@ def convert_signed_int64(value: int) -> int:
 
 def parse_power_details(output: str) -> Optional[float]:
     """Parse wattage from PowerOutDetails nested structure."""
-    match = re.search(r'"PowerOutDetails"\s*=\s*\([^)]*"Watts"\s*=\s*(\d+)', output)
+    match = _POWER_DETAILS_RE.search(output)
     if match:
         return int(match.group(1)) / 1000.0
     return None
 
 
-def parse_ioreg_battery() -> Dict[str, Any]:
-    """Parse battery info from ioreg."""
-    output = run_command("ioreg -rn AppleSmartBattery")
-    data = {}
-    
-    patterns = {
-        'CycleCount': r'"CycleCount"\s*=\s*(\d+)',
-        'DesignCapacity': r'"DesignCapacity"\s*=\s*(\d+)',
-        'MaxCapacity': r'"MaxCapacity"\s*=\s*(\d+)',
-        'AppleRawMaxCapacity': r'"AppleRawMaxCapacity"\s*=\s*(\d+)',
-        'NominalChargeCapacity': r'"NominalChargeCapacity"\s*=\s*(\d+)',
-        'CurrentCapacity': r'"CurrentCapacity"\s*=\s*(\d+)',
-        'AppleRawCurrentCapacity': r'"AppleRawCurrentCapacity"\s*=\s*(\d+)',
-        'Voltage': r'"Voltage"\s*=\s*(\d+)',
-        'Amperage': r'"Amperage"\s*=\s*(\d+)',
-        'Temperature': r'"Temperature"\s*=\s*(\d+)',
-        'IsCharging': r'"IsCharging"\s*=\s*(Yes|No)',
-        'ExternalConnected': r'"ExternalConnected"\s*=\s*(Yes|No)',
-        'TimeRemaining': r'"TimeRemaining"\s*=\s*(\d+)',
-    }
+def parse_ioreg_battery(
+    output: str,
+    known: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    Parse battery info from `ioreg -rn AppleSmartBattery` output.
+    Keys already present in `known` are taken as-is and not re-parsed.
+    """
+    data = dict(known) if known else {}
     
-    for key, pattern in patterns.items():
-        match = re.search(pattern, output)
-        if match:
-            value = match.group(1)
-            if value in ('Yes', 'No'):
-                data[key] = value == 'Yes'
-            else:
+    # Top-level properties are printed one per line as `"Key" = Value`
+    for line in output.split('\n'):
+        line = line.lstrip(' |')
+        if not line.startswith('"'):
+            continue
+        end = line.find('"', 1)
+        key = line[1:end]
+        if key not in _IOREG_KEYS or key in data:
+            continue
+        _, _, value = line[end + 1:].partition('=')
+        value = value.strip()
+        if value in ('Yes', 'No'):
+            data[key] = value == 'Yes'
+        else:
+            try:
                 data[key] = int(value)
+            except ValueError:
+                continue
+        if len(data) == len(_IOREG_KEYS):
+            break
     
     return data
 
 
-def parse_pmset_battery() -> Dict[str, Any]:
-    """Parse battery info from pmset."""
-    output = run_command("pmset -g batt")
-    data = {'percentage': 0, 'source': 'unknown'}
+def parse_battery_level(ioreg: Dict[str, Any]) -> Dict[str, Any]:
+    """Derive the charge level `pmset -g batt` would report from ioreg data."""
+    data = {'percentage': 0}
     
-    # Parse percentage
-    match = re.search(r'(\d+)%', output)
-    if match:
-        data['percentage'] = int(match.group(1))
-    
-    # Parse power source
-    if 'AC Power' in output:
-        data['source'] = 'ac'
-    elif 'Battery Power' in output:
-        data['source'] = 'battery'
+    # Both capacities are percents on Apple Silicon and mAh on Intel
+    max_cap = ioreg.get('MaxCapacity')
+    if max_cap:
+        data['percentage'] = round(ioreg.get('CurrentCapacity', 0) / max_cap * 100)
     
-    # Parse time remaining
-    time_match = re.search(r'(\d+):(\d+) remaining', output)
-    if time_match:
-        hours, mins = int(time_match.group(1)), int(time_match.group(2))
-        data['time_remaining'] = hours * 60 + mins
+    time_remaining = ioreg.get('TimeRemaining')
+    if time_remaining is not None and time_remaining < _NO_TIME_ESTIMATE:
+        data['time_remaining'] = time_remaining
     
     return data
 
 
 def get_cpu_usage() -> float:
-    """Get current CPU usage percentage."""
-    output = run_command("top -l 1 -n 0 | grep 'CPU usage'")
-    match = re.search(r'(\d+\.?\d*)% user.*?(\d+\.?\d*)% sys', output)
+    """Get CPU usage percentage since the previous sample."""
+    global _cpu_sampled_at
+    
+    if psutil is not None:
+        # One-shot CLI runs get here milliseconds after the import-time
+        # prime; block briefly instead of reporting a near-empty window
+        if time.monotonic() - _cpu_sampled_at < _MIN_CPU_SAMPLE_SECONDS:
+            usage = psutil.cpu_percent(interval=_MIN_CPU_SAMPLE_SECONDS)
+        else:
+            usage = psutil.cpu_percent(interval=None)
+        _cpu_sampled_at = time.monotonic()
+        return usage
+
+    output = run_command(["top", "-l", "1", "-n", "0"])
+    match = _CPU_RE.search(output)
     if match:
         return float(match.group(1)) + float(match.group(2))
     return 0.0
 
 
+@lru_cache(maxsize=1)
+def _display_brightness_reader() -> Optional[Callable[[], float]]:
+    """Bind CoreDisplay's brightness getter, or None where it is unavailable."""
+    try:
+        core_display = ctypes.CDLL(
+            '/System/Library/Frameworks/CoreDisplay.framework/CoreDisplay'
+        )
+        core_graphics = ctypes.CDLL(
+            '/System/Library/Frameworks/CoreGraphics.framework/CoreGraphics'
+        )
+        get_brightness = core_display.CoreDisplay_Display_GetUserBrightness
+        main_display_id = core_graphics.CGMainDisplayID
+    except (OSError, AttributeError):
+        return None
+    
+    get_brightness.argtypes = [ctypes.c_uint32]
+    get_brightness.restype = ctypes.c_double
+    main_display_id.restype = ctypes.c_uint32
+    return lambda: get_brightness(main_display_id())
+
+
 def get_display_brightness() -> int:
     """Get display brightness percentage."""
-    output = run_command("brightness -l 2>/dev/null | grep 'display 0'")
-    match = re.search(r'brightness\s+(\d+\.?\d*)', output)
-    if match:
-        return int(float(match.group(1)) * 100)
+    # Query CoreDisplay in-process; fall back to the `brightness` tool
+    reader = _display_brightness_reader()
+    if reader is not None:
+        brightness = reader()
+        if 0 <= brightness <= 1:
+            return int(brightness * 100)
+    
+    output = run_command(["brightness", "-l"])
+    for line in output.split('\n'):
+        if 'display 0' not in line:
+            continue
+        match = _BRIGHTNESS_RE.search(line)
+        if match:
+            return int(float(match.group(1)) * 100)
     return -1
 
 
 def get_active_apps() -> List[str]:
     """Get list of currently running user applications."""
-    output = run_command(
-        "ps aux | grep -v grep | awk '{print $11}' | "
-        "grep -E '^/Applications|^/System/Applications' | "
-        "xargs -I {} basename {} .app | sort -u | head -20"
-    )
-    apps = [app.strip() for app in output.split('\n') if app.strip()]
-    return apps
+    output = run_command(["ps", "-Ao", "comm"])
+    apps = set()
+    for line in output.split('\n'):
+        path = line.strip()
+        if path.startswith(_APP_DIRECTORIES):
+            # Name helpers and nested executables after the outermost bundle
+            bundle = path.split('.app/', 1)[0]
+            apps.add(os.path.basename(bundle).removesuffix('.app'))
+    return sorted(apps)[:20]
 
 
-def get_power_assertions() -> List[Dict[str, str]]:
-    """Get apps preventing sleep/idle."""
-    output = run_command("pmset -g assertions")
+def parse_power_assertions(output: str) -> List[Dict[str, str]]:
+    """Parse apps preventing sleep/idle from `pmset -g assertions` output."""
     assertions = []
     
-    # Parse assertion details
-    for match in re.finditer(
-        r'pid (\d+)\(([^)]+)\):\s*\[([^\]]+)\]\s*(\d+:\d+:\d+)\s+(.+)',
-        output
-    ):
+    # Parse assertion details; most lines are headers, so check the prefix first
+    for line in output.split('\n'):
+        if not line.lstrip().startswith('pid '):
+            continue
+        match = _ASSERTION_RE.search(line)
+        if not match:
+            continue
         assertions.append({
             'pid': match.group(1),
             'process': match.group(2),
@@ -183,9 +318,12 @@ def get_power_assertions() -> List[Dict[str, str]]:
 
 def get_top_energy_consumers() -> List[Dict[str, Any]]:
     """Get processes consuming the most energy."""
-    output = run_command(
-        "top -l 1 -n 10 -o power -stats pid,command,cpu,power"
-    )
+    # Ordered by top's energy impact; psutil has no equivalent, and its
+    # per-process cpu_percent reads 0.0 on a process's first sample
+    output = run_command([
+        "top", "-l", "1", "-n", "10", "-o", "power",
+        "-stats", "pid,command,cpu,power",
+    ])
     consumers = []
     
     for line in output.split('\n'):
@@ -203,11 +341,40 @@ def get_top_energy_consumers() -> List[Dict[str, Any]]:
     return consumers[:10]
 
 
-def collect_battery_snapshot() -> BatterySnapshot:
-    """Collect a complete battery snapshot."""
-    ioreg_output = run_command("ioreg -rn AppleSmartBattery")
-    ioreg = parse_ioreg_battery()
-    pmset = parse_pmset_battery()
+def collect_battery_snapshot(use_cache: bool = True) -> BatterySnapshot:
+    """
+    Collect a complete battery snapshot, reusing one taken moments ago.
+    Pass use_cache=False when every call must store a new reading.
+    """
+    if not use_cache:
+        return _read_battery_snapshot()
+    return _cached_battery_snapshot(int(time.monotonic() // _SNAPSHOT_TTL_SECONDS))
+
+
+@lru_cache(maxsize=1)
+def _cached_battery_snapshot(ttl_bucket: int) -> BatterySnapshot:
+    """Memoized snapshot; `ttl_bucket` only keys the cache."""
+    return _read_battery_snapshot()
+
+
+def _read_battery_snapshot() -> BatterySnapshot:
+    """Collect a fresh snapshot."""
+    # Each source is a separate subprocess; run them side by side so the
+    # snapshot costs roughly as much as the slowest command.
+    with ThreadPoolExecutor(max_workers=5) as pool:
+        ioreg_future = pool.submit(run_command, ["ioreg", "-rn", "AppleSmartBattery"])
+        assertions_future = pool.submit(run_command, ["pmset", "-g", "assertions"])
+        cpu_future = pool.submit(get_cpu_usage)
+        brightness_future = pool.submit(get_display_brightness)
+        apps_future = pool.submit(get_active_apps)
+
+    ioreg_output = ioreg_future.result()
+    slow_fields = _slow_fields.get()
+    ioreg = parse_ioreg_battery(ioreg_output, slow_fields)
+    if not slow_fields:
+        _slow_fields.update(ioreg)
+    # pmset -g batt only reformats these ioreg values, so it is not run
+    level = parse_battery_level(ioreg)
 
     # Use raw capacity values (mAh), falling back to legacy fields
     design_cap = ioreg.get('DesignCapacity', 1)
@@ -236,10 +403,10 @@ def collect_battery_snapshot() -> BatterySnapshot:
 
     return BatterySnapshot(
         timestamp=datetime.now().isoformat(),
-        percentage=pmset.get('percentage', 0),
+        percentage=level['percentage'],
         is_charging=ioreg.get('IsCharging', False),
         is_plugged_in=ioreg.get('ExternalConnected', False),
-        time_remaining_minutes=pmset.get('time_remaining'),
+        time_remaining_minutes=level.get('time_remaining'),
         cycle_count=ioreg.get('CycleCount', 0),
         design_capacity_mah=design_cap,
         max_capacity_mah=max_cap,
@@ -249,35 +416,31 @@ def collect_battery_snapshot() -> BatterySnapshot:
         amperage_ma=amperage_signed,
         wattage=round(wattage, 2),
         temperature_celsius=round(temp, 1),
-        cpu_usage_percent=round(get_cpu_usage(), 1),
-        active_apps=get_active_apps(),
-        display_brightness=get_display_brightness(),
-        power_assertions=get_power_assertions()
+        cpu_usage_percent=round(cpu_future.result(), 1),
+        active_apps=apps_future.result(),
+        display_brightness=brightness_future.result(),
+        power_assertions=parse_power_assertions(assertions_future.result())
     )
 
 
 def snapshot_to_dict(snapshot: BatterySnapshot) -> Dict[str, Any]:
     """Convert snapshot to dictionary."""
-    return asdict(snapshot)
+    # Shallow on purpose: asdict() deep-copies the app and assertion lists
+    return {f.name: getattr(snapshot, f.name) for f in _SNAPSHOT_FIELDS}
 
 
 def parse_pmset_log() -> List[Dict[str, Any]]:
     """Parse pmset log to extract historical battery events."""
-    output = run_command("pmset -g log")
     events = []
-
-    # Pattern for lines with battery info
-    # Format: 2025-12-30 20:08:05 -0500 Sleep  Entering Sleep... Using Batt (Charge:99%)
-    pattern = re.compile(
-        r'(\d{4}-\d{2}-\d{2}\s+\d{2}:\d{2}:\d{2}\s+[+-]\d{4})\s+'  # Timestamp with TZ
-        r'(\w+)\s+'  # Event type (Sleep, Wake, DarkWake, Assertions, etc.)
-        r'.*?'  # Message content
-        r'Using\s+(Batt|AC|BATT)'  # Power source
-        r'.*?\(Charge:\s*(\d+)%?\)'  # Battery percentage
-    )
-
-    for line in output.split('\n'):
-        match = pattern.search(line)
+    # The log spans few UTC offsets; build each tzinfo once
+    tz_cache: Dict[str, timezone] = {}
+
+    # The log can be megabytes; parse it as pmset emits it
+    for line in stream_command(["pmset", "-g", "log"]):
+        # Cheap substring checks skip the regex on most log lines
+        if 'Using' not in line or 'Charge:' not in line:
+            continue
+        match = _PMSET_LOG_RE.search(line)
         if match:
             timestamp_str = match.group(1)
             event_type = match.group(2)
@@ -287,19 +450,20 @@ def parse_pmset_log() -> List[Dict[str, Any]]:
             # Parse timestamp with timezone
             # Format: 2025-12-30 20:08:05 -0500
             try:
-                from datetime import timezone, timedelta as td
                 # Parse manually since strptime %z can be finicky
                 parts = timestamp_str.rsplit(' ', 1)
                 dt_part = parts[0]
                 tz_part = parts[1]
                 dt = datetime.strptime(dt_part, '%Y-%m-%d %H:%M:%S')
-                # Parse timezone offset
-                tz_sign = 1 if tz_part[0] == '+' else -1
-                tz_hours = int(tz_part[1:3])
-                tz_mins = int(tz_part[3:5])
-                tz_offset = td(hours=tz_hours, minutes=tz_mins) * tz_sign
-                dt = dt.replace(tzinfo=timezone(tz_offset))
-                iso_timestamp = dt.isoformat()
+                tz = tz_cache.get(tz_part)
+                if tz is None:
+                    # Parse timezone offset
+                    tz_sign = 1 if tz_part[0] == '+' else -1
+                    tz_hours = int(tz_part[1:3])
+                    tz_mins = int(tz_part[3:5])
+                    tz_offset = timedelta(hours=tz_hours, minutes=tz_mins) * tz_sign
+                    tz = tz_cache[tz_part] = timezone(tz_offset)
+                iso_timestamp = dt.replace(tzinfo=tz).isoformat()
             except (ValueError, IndexError):
                 continue
 
@@ -10,6 +10,7 @@ import time
 import signal
 import argparse
 import logging
+import threading
 from pathlib import Path
 from datetime import datetime
 
@@ -28,7 +29,7 @@ class BatteryMonitorDaemon:
     ):
         self.interval = interval_seconds
         self.db = BatteryDatabase(db_path)
-        self.running = False
+        self._stop = threading.Event()
         self.setup_logging(log_path)
         
         # Handle shutdown signals
@@ -53,19 +54,19 @@ class BatteryMonitorDaemon:
     def _handle_shutdown(self, signum, frame):
         """Handle shutdown signals gracefully."""
         self.logger.info(f"Received signal {signum}, shutting down...")
-        self.running = False
+        self._stop.set()
     
     def collect_and_store(self):
         """Collect a snapshot and store it."""
         try:
-            snapshot = collect_battery_snapshot()
-            snapshot_dict = snapshot_to_dict(snapshot)
+            # Every tick is stored, so never reuse the CLI's short-lived memo
+            snapshot = collect_battery_snapshot(use_cache=False)
             
             # Store in database
-            snapshot_id = self.db.insert_snapshot(snapshot_dict)
+            snapshot_id = self.db.insert_snapshot(snapshot)
             
             # Update discharge session tracking
-            self.db.update_discharge_session(snapshot_dict)
+            self.db.update_discharge_session(snapshot)
             
             self.logger.info(
                 f"Snapshot #{snapshot_id}: {snapshot.percentage}% | "
@@ -73,7 +74,7 @@ class BatteryMonitorDaemon:
                 f"{'⚡ Charging' if snapshot.is_charging else '🔋 Discharging'}"
             )
             
-            return snapshot_dict
+            return snapshot
             
         except Exception as e:
             self.logger.error(f"Error collecting snapshot: {e}")
@@ -81,25 +82,30 @@ class BatteryMonitorDaemon:
     
     def run(self):
         """Main daemon loop."""
-        self.running = True
+        self._stop.clear()
         self.logger.info(
             f"Battery Monitor started. Collecting every {self.interval}s. "
             f"DB: {self.db.db_path}"
         )
         
-        # Collect immediately on start
-        self.collect_and_store()
-        
-        while self.running:
-            time.sleep(self.interval)
-            if self.running:
-                self.collect_and_store()
+        # Ticks are fixed monotonic deadlines so collection time doesn't
+        # accumulate as drift; the event wakes the wait on shutdown
+        next_tick = time.monotonic()
+        while not self._stop.is_set():
+            self.collect_and_store()
+            
+            now = time.monotonic()
+            # After an overrun (or sleep) resume from now rather than
+            # firing a burst of catch-up collections
+            next_tick = max(next_tick + self.interval, now)
+            self._stop.wait(next_tick - now)
         
         self.logger.info("Battery Monitor stopped.")
     
     def run_once(self):
         """Collect a single snapshot (useful for testing)."""
-        return self.collect_and_store()
+        snapshot = self.collect_and_store()
+        return snapshot_to_dict(snapshot) if snapshot else None
 
 
 def get_pid_file() -> Path:
@@ -6,11 +6,167 @@ Handles SQLite storage for battery metrics with efficient querying.
 
 import sqlite3
 import json
-from datetime import datetime, timedelta
+import operator
+import threading
+from itertools import islice
+from datetime import date, datetime, timedelta
 from pathlib import Path
-from typing import List, Dict, Any, Optional, Tuple
+from typing import TYPE_CHECKING, List, Dict, Any, Iterator, Optional, Tuple
 from contextlib import contextmanager
 
+if TYPE_CHECKING:
+    from battery_collector import BatterySnapshot
+
+
+# Per-connection settings; journal_mode=WAL is persistent and set once at init
+_CONNECTION_PRAGMAS = """
+    PRAGMA synchronous = NORMAL;
+    PRAGMA busy_timeout = 5000;
+    PRAGMA temp_store = MEMORY;
+    PRAGMA cache_size = -20000;
+    PRAGMA foreign_keys = ON;
+    PRAGMA analysis_limit = 1000;
+"""
+
+
+# Snapshot columns written from BatterySnapshot attributes of the same name
+_SNAPSHOT_COLUMNS = (
+    'timestamp', 'percentage', 'is_charging', 'is_plugged_in',
+    'time_remaining_minutes', 'cycle_count', 'design_capacity_mah',
+    'max_capacity_mah', 'current_capacity_mah', 'health_percentage',
+    'voltage_mv', 'amperage_ma', 'wattage', 'temperature_celsius',
+    'cpu_usage_percent', 'display_brightness',
+)
+
+# Hot write statements, shared with the connection's statement cache
+_INSERT_SNAPSHOT_SQL = (
+    f"INSERT INTO snapshots ({', '.join(_SNAPSHOT_COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(_SNAPSHOT_COLUMNS))})\n"
+)
+
+# Parameter tuple in column order; sqlite3 stores bools as 0/1
+_snapshot_row = operator.attrgetter(*_SNAPSHOT_COLUMNS)
+
+# RETURNING (SQLite 3.35+) hands back the new id from the INSERT step itself
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+if _HAS_RETURNING:
+    _INSERT_SNAPSHOT_SQL += "RETURNING id\n"
+
+_INSERT_ACTIVE_APP_SQL = (
+    "INSERT INTO active_apps (snapshot_id, app_name) VALUES (?, ?)"
+)
+
+_INSERT_POWER_ASSERTION_SQL = """
+    INSERT INTO power_assertions 
+    (snapshot_id, pid, process, assertion_type, duration, reason)
+    VALUES (?, ?, ?, ?, ?, ?)
+"""
+
+# Opens a session unless one is already active
+_START_DISCHARGE_SESSION_SQL = """
+    INSERT INTO discharge_sessions 
+    (start_time, start_percentage)
+    SELECT :timestamp, :percentage
+    WHERE NOT EXISTS (SELECT 1 FROM discharge_sessions WHERE is_active = 1)
+"""
+
+# Closes the active session; elapsed time is computed in whole milliseconds
+# so julianday() float noise cannot truncate a minute away
+_END_DISCHARGE_SESSION_SQL = """
+    UPDATE discharge_sessions 
+    SET end_time = :timestamp,
+        end_percentage = :percentage,
+        duration_minutes = CAST(
+            ROUND((julianday(:timestamp) - julianday(start_time)) * 86400000)
+            / 60000 AS INTEGER
+        ),
+        drain_rate_per_hour = CASE
+            WHEN julianday(:timestamp) > julianday(start_time) THEN ROUND(
+                (start_percentage - :percentage) * 3600000.0
+                / ROUND((julianday(:timestamp) - julianday(start_time)) * 86400000),
+                2
+            )
+            ELSE 0
+        END,
+        avg_wattage = (
+            SELECT AVG(wattage) FROM snapshots
+            WHERE timestamp BETWEEN discharge_sessions.start_time AND :timestamp
+        ),
+        avg_cpu_usage = (
+            SELECT AVG(cpu_usage_percent) FROM snapshots
+            WHERE timestamp BETWEEN discharge_sessions.start_time AND :timestamp
+        ),
+        is_active = 0
+    WHERE is_active = 1
+"""
+
+# Recomputes snapshots_hourly buckets earlier than :before (all when NULL).
+# Buckets are UTC hours, so rows with an offset up to a day past :before
+# (:rows_before) can still fall into them.
+_REBUILD_SNAPSHOTS_HOURLY_SQL = """
+    INSERT INTO snapshots_hourly
+    SELECT
+        strftime('%Y-%m-%d %H:00', timestamp) as ts_hour,
+        MIN(percentage),
+        MAX(percentage),
+        TOTAL(percentage),
+        TOTAL(wattage),
+        COUNT(wattage),
+        TOTAL(cpu_usage_percent),
+        COUNT(cpu_usage_percent),
+        TOTAL(temperature_celsius),
+        COUNT(temperature_celsius),
+        COUNT(*),
+        SUM(CASE WHEN is_charging = 0 THEN 1 ELSE 0 END)
+    FROM snapshots
+    WHERE :rows_before IS NULL OR timestamp < :rows_before
+    GROUP BY ts_hour
+    HAVING :before IS NULL OR ts_hour < :before
+"""
+
+# user_version from which drain_hourly has been backfilled
+_DRAIN_ROLLUP_VERSION = 1
+
+# Recomputes drain_hourly days earlier than :before (all when NULL), pairing
+# each discharging snapshot with the previous one as trg_drain_hourly does
+_REBUILD_DRAIN_HOURLY_SQL = """
+    INSERT INTO drain_hourly
+    SELECT
+        substr(timestamp, 1, 10) as day,
+        strftime('%H', timestamp) as hour,
+        TOTAL(drain),
+        TOTAL(wattage),
+        COUNT(wattage),
+        TOTAL(cpu_usage_percent),
+        COUNT(cpu_usage_percent),
+        COUNT(*)
+    FROM (
+        SELECT
+            timestamp, wattage, cpu_usage_percent,
+            percentage - LAG(percentage) OVER (ORDER BY timestamp) as drain
+        FROM snapshots
+        WHERE is_charging = 0 AND (:before IS NULL OR timestamp < :before)
+    )
+    WHERE drain < 0
+    GROUP BY day, hour
+"""
+
+# Snapshots encoded per write() during export
+_EXPORT_CHUNK_ROWS = 1000
+
+
+def _iter_dicts(cursor: sqlite3.Cursor) -> Iterator[Dict[str, Any]]:
+    """Yield a cursor's rows as dicts, resolving column names only once."""
+    cursor.row_factory = None
+    keys = [column[0] for column in cursor.description]
+    for row in cursor:
+        yield dict(zip(keys, row))
+
+
+def _fetch_dicts(cursor: sqlite3.Cursor) -> List[Dict[str, Any]]:
+    """Fetch all of a cursor's rows as dicts."""
+    return list(_iter_dicts(cursor))
+
 
 class BatteryDatabase:
     """SQLite database for battery metrics storage and analysis."""
@@ -18,142 +174,335 @@ class BatteryDatabase:
     def __init__(self, db_path: str = "~/.battery_monitor/battery.db"):
         self.db_path = Path(db_path).expanduser()
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        # get_connection() nesting depth; only the outermost level commits
+        self._depth = 0
+        self._conn = self._connect()
         self._init_database()
     
-    @contextmanager
-    def get_connection(self):
-        """Context manager for database connections."""
-        conn = sqlite3.connect(str(self.db_path))
+    def _connect(self) -> sqlite3.Connection:
+        """Open the connection shared by every call on this instance."""
+        # Transactions are managed explicitly in get_connection()
+        conn = sqlite3.connect(
+            str(self.db_path),
+            check_same_thread=False,
+            isolation_level=None,
+            cached_statements=256,
+        )
         conn.row_factory = sqlite3.Row
-        try:
-            yield conn
-            conn.commit()
-        finally:
-            conn.close()
+        conn.executescript(_CONNECTION_PRAGMAS)
+        return conn
+    
+    @contextmanager
+    def get_connection(self, immediate: bool = False):
+        """Context manager running one transaction on the shared connection.
+        
+        Writers pass immediate=True to take the write lock up front rather
+        than upgrading a deferred transaction mid-way. Calls made on the
+        same thread while a transaction is open (e.g. from inside an
+        iter_snapshots_range() loop) join it instead of starting another;
+        other threads wait until it ends.
+        """
+        with self._lock:
+            if self._depth:
+                self._depth += 1
+                try:
+                    yield self._conn
+                finally:
+                    self._depth -= 1
+                return
+            
+            self._conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+            self._depth = 1
+            try:
+                yield self._conn
+                self._conn.execute("COMMIT")
+            except BaseException:
+                # Also covers a failed COMMIT, which leaves the transaction open
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+            finally:
+                self._depth = 0
     
     def _init_database(self):
         """Initialize database schema."""
-        with self.get_connection() as conn:
-            conn.executescript("""
-                -- Main snapshots table
-                CREATE TABLE IF NOT EXISTS snapshots (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    timestamp TEXT NOT NULL,
-                    percentage INTEGER NOT NULL,
-                    is_charging INTEGER NOT NULL,
-                    is_plugged_in INTEGER NOT NULL,
-                    time_remaining_minutes INTEGER,
-                    cycle_count INTEGER,
-                    design_capacity_mah INTEGER,
-                    max_capacity_mah INTEGER,
-                    current_capacity_mah INTEGER,
-                    health_percentage REAL,
-                    voltage_mv INTEGER,
-                    amperage_ma INTEGER,
-                    wattage REAL,
-                    temperature_celsius REAL,
-                    cpu_usage_percent REAL,
-                    display_brightness INTEGER,
-                    created_at TEXT DEFAULT CURRENT_TIMESTAMP
-                );
-                
-                -- Active apps during snapshot
-                CREATE TABLE IF NOT EXISTS active_apps (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    snapshot_id INTEGER NOT NULL,
-                    app_name TEXT NOT NULL,
-                    FOREIGN KEY (snapshot_id) REFERENCES snapshots(id)
-                );
-                
-                -- Power assertions (apps preventing sleep)
-                CREATE TABLE IF NOT EXISTS power_assertions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    snapshot_id INTEGER NOT NULL,
-                    pid TEXT,
-                    process TEXT,
-                    assertion_type TEXT,
-                    duration TEXT,
-                    reason TEXT,
-                    FOREIGN KEY (snapshot_id) REFERENCES snapshots(id)
-                );
-                
-                -- Discharge sessions for tracking battery drain patterns
-                CREATE TABLE IF NOT EXISTS discharge_sessions (
-                    id INTEGER PRIMARY KEY AUTOINCREMENT,
-                    start_time TEXT NOT NULL,
-                    end_time TEXT,
-                    start_percentage INTEGER NOT NULL,
-                    end_percentage INTEGER,
-                    duration_minutes INTEGER,
-                    drain_rate_per_hour REAL,
-                    avg_wattage REAL,
-                    avg_cpu_usage REAL,
-                    is_active INTEGER DEFAULT 1
-                );
-                
-                -- Indexes for common queries
-                CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp 
-                    ON snapshots(timestamp);
-                CREATE INDEX IF NOT EXISTS idx_snapshots_percentage 
-                    ON snapshots(percentage);
-                CREATE INDEX IF NOT EXISTS idx_active_apps_snapshot 
-                    ON active_apps(snapshot_id);
-                CREATE INDEX IF NOT EXISTS idx_assertions_snapshot 
-                    ON power_assertions(snapshot_id);
-            """)
+        conn = self._conn
+        
+        # Only takes effect on a fresh file; cleanup converts older ones
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
+        # WAL lets CLI reads run while the daemon writes and fsyncs less
+        if str(self.db_path) != ':memory:':
+            conn.execute("PRAGMA journal_mode = WAL")
+        
+        # executescript() manages its own transaction, so it runs outside one
+        conn.executescript("""
+            -- Main snapshots table
+            CREATE TABLE IF NOT EXISTS snapshots (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                timestamp TEXT NOT NULL,
+                percentage INTEGER NOT NULL,
+                is_charging INTEGER NOT NULL,
+                is_plugged_in INTEGER NOT NULL,
+                time_remaining_minutes INTEGER,
+                cycle_count INTEGER,
+                design_capacity_mah INTEGER,
+                max_capacity_mah INTEGER,
+                current_capacity_mah INTEGER,
+                health_percentage REAL,
+                voltage_mv INTEGER,
+                amperage_ma INTEGER,
+                wattage REAL,
+                temperature_celsius REAL,
+                cpu_usage_percent REAL,
+                display_brightness INTEGER,
+                created_at TEXT DEFAULT CURRENT_TIMESTAMP
+            );
+            
+            -- Active apps during snapshot
+            CREATE TABLE IF NOT EXISTS active_apps (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                snapshot_id INTEGER NOT NULL,
+                app_name TEXT NOT NULL,
+                FOREIGN KEY (snapshot_id) REFERENCES snapshots(id)
+            );
+            
+            -- Power assertions (apps preventing sleep)
+            CREATE TABLE IF NOT EXISTS power_assertions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                snapshot_id INTEGER NOT NULL,
+                pid TEXT,
+                process TEXT,
+                assertion_type TEXT,
+                duration TEXT,
+                reason TEXT,
+                FOREIGN KEY (snapshot_id) REFERENCES snapshots(id)
+            );
+            
+            -- Discharge sessions for tracking battery drain patterns
+            CREATE TABLE IF NOT EXISTS discharge_sessions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                start_time TEXT NOT NULL,
+                end_time TEXT,
+                start_percentage INTEGER NOT NULL,
+                end_percentage INTEGER,
+                duration_minutes INTEGER,
+                drain_rate_per_hour REAL,
+                avg_wattage REAL,
+                avg_cpu_usage REAL,
+                is_active INTEGER DEFAULT 1
+            );
+            
+            -- Hourly rollup of snapshots so daily stats read ~24 rows/day
+            CREATE TABLE IF NOT EXISTS snapshots_hourly (
+                ts_hour TEXT PRIMARY KEY,
+                min_percentage INTEGER NOT NULL,
+                max_percentage INTEGER NOT NULL,
+                percentage_sum REAL NOT NULL,
+                wattage_sum REAL NOT NULL,
+                wattage_samples INTEGER NOT NULL,
+                cpu_sum REAL NOT NULL,
+                cpu_samples INTEGER NOT NULL,
+                temp_sum REAL NOT NULL,
+                temp_samples INTEGER NOT NULL,
+                sample_count INTEGER NOT NULL,
+                discharge_samples INTEGER NOT NULL
+            );
+            
+            -- Per day and hour-of-day drain between consecutive discharging
+            -- snapshots, so drain patterns never re-window the full history
+            CREATE TABLE IF NOT EXISTS drain_hourly (
+                day TEXT NOT NULL,
+                hour TEXT NOT NULL,
+                drain_sum REAL NOT NULL,
+                wattage_sum REAL NOT NULL,
+                wattage_samples INTEGER NOT NULL,
+                cpu_sum REAL NOT NULL,
+                cpu_samples INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                PRIMARY KEY (day, hour)
+            );
+            
+            CREATE TRIGGER IF NOT EXISTS trg_snapshots_hourly
+            AFTER INSERT ON snapshots
+            BEGIN
+                INSERT INTO snapshots_hourly VALUES (
+                    strftime('%Y-%m-%d %H:00', NEW.timestamp),
+                    NEW.percentage,
+                    NEW.percentage,
+                    NEW.percentage,
+                    COALESCE(NEW.wattage, 0),
+                    NEW.wattage IS NOT NULL,
+                    COALESCE(NEW.cpu_usage_percent, 0),
+                    NEW.cpu_usage_percent IS NOT NULL,
+                    COALESCE(NEW.temperature_celsius, 0),
+                    NEW.temperature_celsius IS NOT NULL,
+                    1,
+                    NEW.is_charging = 0
+                )
+                ON CONFLICT(ts_hour) DO UPDATE SET
+                    min_percentage = MIN(min_percentage, excluded.min_percentage),
+                    max_percentage = MAX(max_percentage, excluded.max_percentage),
+                    percentage_sum = percentage_sum + excluded.percentage_sum,
+                    wattage_sum = wattage_sum + excluded.wattage_sum,
+                    wattage_samples = wattage_samples + excluded.wattage_samples,
+                    cpu_sum = cpu_sum + excluded.cpu_sum,
+                    cpu_samples = cpu_samples + excluded.cpu_samples,
+                    temp_sum = temp_sum + excluded.temp_sum,
+                    temp_samples = temp_samples + excluded.temp_samples,
+                    sample_count = sample_count + 1,
+                    discharge_samples = discharge_samples + excluded.discharge_samples;
+            END;
+            
+            -- Child rows go with their snapshot, via the snapshot_id indexes
+            CREATE TRIGGER IF NOT EXISTS trg_snapshots_delete_children
+            BEFORE DELETE ON snapshots
+            BEGIN
+                DELETE FROM active_apps WHERE snapshot_id = OLD.id;
+                DELETE FROM power_assertions WHERE snapshot_id = OLD.id;
+            END;
+            
+            CREATE TRIGGER IF NOT EXISTS trg_drain_hourly
+            AFTER INSERT ON snapshots
+            WHEN NEW.is_charging = 0
+            BEGIN
+                INSERT INTO drain_hourly
+                SELECT
+                    substr(NEW.timestamp, 1, 10),
+                    strftime('%H', NEW.timestamp),
+                    NEW.percentage - prev.percentage,
+                    COALESCE(NEW.wattage, 0),
+                    NEW.wattage IS NOT NULL,
+                    COALESCE(NEW.cpu_usage_percent, 0),
+                    NEW.cpu_usage_percent IS NOT NULL,
+                    1
+                FROM (
+                    SELECT percentage FROM snapshots
+                    WHERE is_charging = 0 AND timestamp < NEW.timestamp
+                    ORDER BY timestamp DESC
+                    LIMIT 1
+                ) AS prev
+                WHERE NEW.percentage < prev.percentage
+                ON CONFLICT(day, hour) DO UPDATE SET
+                    drain_sum = drain_sum + excluded.drain_sum,
+                    wattage_sum = wattage_sum + excluded.wattage_sum,
+                    wattage_samples = wattage_samples + excluded.wattage_samples,
+                    cpu_sum = cpu_sum + excluded.cpu_sum,
+                    cpu_samples = cpu_samples + excluded.cpu_samples,
+                    samples = samples + 1;
+            END;
+            
+            -- Indexes for common queries
+            CREATE INDEX IF NOT EXISTS idx_snapshots_timestamp 
+                ON snapshots(timestamp);
+            CREATE INDEX IF NOT EXISTS idx_snapshots_percentage 
+                ON snapshots(percentage);
+            CREATE INDEX IF NOT EXISTS idx_snapshots_charging_timestamp
+                ON snapshots(is_charging, timestamp);
+            -- Covers the app-frequency join; supersedes the snapshot_id index
+            DROP INDEX IF EXISTS idx_active_apps_snapshot;
+            CREATE INDEX IF NOT EXISTS idx_active_apps_snapshot_app
+                ON active_apps(snapshot_id, app_name);
+            CREATE INDEX IF NOT EXISTS idx_assertions_snapshot 
+                ON power_assertions(snapshot_id);
+            -- At most one session is active; keeps that lookup O(1)
+            CREATE INDEX IF NOT EXISTS idx_discharge_active
+                ON discharge_sessions(is_active) WHERE is_active = 1;
+        """)
+        
+        with self.get_connection(immediate=True) as conn:
+            # Databases created before the rollup existed need a backfill
+            rollup_empty = not conn.execute(
+                "SELECT 1 FROM snapshots_hourly LIMIT 1"
+            ).fetchone()
+            if rollup_empty:
+                self._rebuild_snapshots_hourly(conn)
+            
+            # Backfill drain_hourly exactly once; it can legitimately stay
+            # empty (e.g. on AC at 100%), so emptiness is not the signal
+            if conn.execute("PRAGMA user_version").fetchone()[0] < _DRAIN_ROLLUP_VERSION:
+                self._rebuild_drain_hourly(conn)
+                conn.execute(f"PRAGMA user_version = {_DRAIN_ROLLUP_VERSION}")
+            
+            # Refresh planner statistics when missing or outgrown by the data
+            if self._planner_stats_stale(conn):
+                conn.execute("ANALYZE")
+    
+    def _rebuild_snapshots_hourly(self, conn: sqlite3.Connection,
+                                  before: Optional[str] = None):
+        """Recompute hourly buckets before the given date (all by default)."""
+        rows_before = None
+        if before is not None:
+            rows_before = (date.fromisoformat(before) + timedelta(days=1)).isoformat()
+        params = {'before': before, 'rows_before': rows_before}
+        conn.execute(
+            "DELETE FROM snapshots_hourly WHERE :before IS NULL OR ts_hour < :before",
+            params
+        )
+        conn.execute(_REBUILD_SNAPSHOTS_HOURLY_SQL, params)
+    
+    def _rebuild_drain_hourly(self, conn: sqlite3.Connection,
+                              before: Optional[str] = None):
+        """Recompute the drain rollup, e.g. after out-of-order inserts."""
+        params = {'before': before}
+        conn.execute("DELETE FROM drain_hourly WHERE :before IS NULL OR day < :before", params)
+        conn.execute(_REBUILD_DRAIN_HOURLY_SQL, params)
+    
+    def _planner_stats_stale(self, conn: sqlite3.Connection) -> bool:
+        """Check whether ANALYZE is missing or predates large table growth."""
+        if not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+        ).fetchone():
+            return True
+        
+        stat = conn.execute(
+            "SELECT stat FROM sqlite_stat1 WHERE idx = 'idx_snapshots_timestamp'"
+        ).fetchone()
+        if stat is None:
+            return True
+        
+        # The first stat field is the row count seen by the last ANALYZE;
+        # refresh once the table has doubled or halved since then
+        analyzed_rows = int(stat[0].split()[0])
+        current_rows = conn.execute("SELECT COUNT(*) FROM snapshots").fetchone()[0]
+        if not analyzed_rows / 2 <= current_rows <= analyzed_rows * 2:
+            return True
+        
+        # Databases analyzed before the covering app index existed
+        return conn.execute(
+            "SELECT 1 FROM sqlite_stat1 WHERE idx = 'idx_active_apps_snapshot_app'"
+        ).fetchone() is None and conn.execute(
+            "SELECT 1 FROM active_apps LIMIT 1"
+        ).fetchone() is not None
     
-    def insert_snapshot(self, snapshot: Dict[str, Any]) -> int:
+    def insert_snapshot(self, snapshot: 'BatterySnapshot') -> int:
         """Insert a battery snapshot and return its ID."""
-        with self.get_connection() as conn:
-            cursor = conn.execute("""
-                INSERT INTO snapshots (
-                    timestamp, percentage, is_charging, is_plugged_in,
-                    time_remaining_minutes, cycle_count, design_capacity_mah,
-                    max_capacity_mah, current_capacity_mah, health_percentage,
-                    voltage_mv, amperage_ma, wattage, temperature_celsius,
-                    cpu_usage_percent, display_brightness
-                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                snapshot['timestamp'],
-                snapshot['percentage'],
-                int(snapshot['is_charging']),
-                int(snapshot['is_plugged_in']),
-                snapshot.get('time_remaining_minutes'),
-                snapshot.get('cycle_count'),
-                snapshot.get('design_capacity_mah'),
-                snapshot.get('max_capacity_mah'),
-                snapshot.get('current_capacity_mah'),
-                snapshot.get('health_percentage'),
-                snapshot.get('voltage_mv'),
-                snapshot.get('amperage_ma'),
-                snapshot.get('wattage'),
-                snapshot.get('temperature_celsius'),
-                snapshot.get('cpu_usage_percent'),
-                snapshot.get('display_brightness'),
-            ))
-            snapshot_id = cursor.lastrowid
+        with self.get_connection(immediate=True) as conn:
+            cursor = conn.execute(_INSERT_SNAPSHOT_SQL, _snapshot_row(snapshot))
+            if _HAS_RETURNING:
+                snapshot_id = cursor.fetchone()[0]
+            else:
+                snapshot_id = cursor.lastrowid
             
             # Insert active apps
-            for app in snapshot.get('active_apps', []):
-                conn.execute(
-                    "INSERT INTO active_apps (snapshot_id, app_name) VALUES (?, ?)",
-                    (snapshot_id, app)
-                )
+            conn.executemany(
+                _INSERT_ACTIVE_APP_SQL,
+                [(snapshot_id, app) for app in snapshot.active_apps]
+            )
             
             # Insert power assertions
-            for assertion in snapshot.get('power_assertions', []):
-                conn.execute("""
-                    INSERT INTO power_assertions 
-                    (snapshot_id, pid, process, assertion_type, duration, reason)
-                    VALUES (?, ?, ?, ?, ?, ?)
-                """, (
+            conn.executemany(_INSERT_POWER_ASSERTION_SQL, [
+                (
                     snapshot_id,
                     assertion.get('pid'),
                     assertion.get('process'),
                     assertion.get('type'),
                     assertion.get('duration'),
                     assertion.get('reason'),
-                ))
+                )
+                for assertion in snapshot.power_assertions
+            ])
             
             return snapshot_id
     
@@ -171,13 +520,21 @@ class BatteryDatabase:
         end: datetime
     ) -> List[Dict[str, Any]]:
         """Get snapshots within a time range."""
+        return list(self.iter_snapshots_range(start, end))
+    
+    def iter_snapshots_range(
+        self,
+        start: datetime,
+        end: datetime
+    ) -> Iterator[Dict[str, Any]]:
+        """Yield snapshots within a time range without loading them all."""
         with self.get_connection() as conn:
-            rows = conn.execute("""
+            cursor = conn.execute("""
                 SELECT * FROM snapshots 
                 WHERE timestamp BETWEEN ? AND ?
                 ORDER BY timestamp ASC
-            """, (start.isoformat(), end.isoformat())).fetchall()
-            return [dict(row) for row in rows]
+            """, (start.isoformat(), end.isoformat()))
+            yield from _iter_dicts(cursor)
     
     def get_snapshots_last_hours(self, hours: int) -> List[Dict[str, Any]]:
         """Get snapshots from the last N hours."""
@@ -186,30 +543,30 @@ class BatteryDatabase:
         return self.get_snapshots_range(start, end)
     
     def get_daily_stats(self, days: int = 30) -> List[Dict[str, Any]]:
-        """Get daily aggregated statistics."""
+        """Get daily aggregated statistics from the hourly rollup."""
         with self.get_connection() as conn:
-            rows = conn.execute("""
+            cursor = conn.execute("""
                 SELECT 
-                    DATE(timestamp) as date,
-                    MIN(percentage) as min_percentage,
-                    MAX(percentage) as max_percentage,
-                    AVG(percentage) as avg_percentage,
-                    AVG(wattage) as avg_wattage,
-                    AVG(cpu_usage_percent) as avg_cpu,
-                    AVG(temperature_celsius) as avg_temp,
-                    COUNT(*) as sample_count,
-                    SUM(CASE WHEN is_charging = 0 THEN 1 ELSE 0 END) as discharge_samples
-                FROM snapshots
-                WHERE timestamp >= DATE('now', ?)
-                GROUP BY DATE(timestamp)
+                    substr(ts_hour, 1, 10) as date,
+                    MIN(min_percentage) as min_percentage,
+                    MAX(max_percentage) as max_percentage,
+                    SUM(percentage_sum) / SUM(sample_count) as avg_percentage,
+                    SUM(wattage_sum) / SUM(wattage_samples) as avg_wattage,
+                    SUM(cpu_sum) / SUM(cpu_samples) as avg_cpu,
+                    SUM(temp_sum) / SUM(temp_samples) as avg_temp,
+                    SUM(sample_count) as sample_count,
+                    SUM(discharge_samples) as discharge_samples
+                FROM snapshots_hourly
+                WHERE ts_hour >= DATE('now', ?)
+                GROUP BY date
                 ORDER BY date DESC
-            """, (f'-{days} days',)).fetchall()
-            return [dict(row) for row in rows]
+            """, (f'-{days} days',))
+            return _fetch_dicts(cursor)
     
     def get_app_frequency(self, days: int = 7) -> List[Dict[str, Any]]:
         """Get frequency of apps during battery drain."""
         with self.get_connection() as conn:
-            rows = conn.execute("""
+            cursor = conn.execute("""
                 SELECT 
                     a.app_name,
                     COUNT(*) as frequency,
@@ -222,13 +579,13 @@ class BatteryDatabase:
                 GROUP BY a.app_name
                 ORDER BY frequency DESC
                 LIMIT 20
-            """, (f'-{days} days',)).fetchall()
-            return [dict(row) for row in rows]
+            """, (f'-{days} days',))
+            return _fetch_dicts(cursor)
     
     def get_power_assertion_stats(self, days: int = 7) -> List[Dict[str, Any]]:
         """Get statistics on power assertions (apps preventing sleep)."""
         with self.get_connection() as conn:
-            rows = conn.execute("""
+            cursor = conn.execute("""
                 SELECT 
                     process,
                     assertion_type,
@@ -240,91 +597,50 @@ class BatteryDatabase:
                 GROUP BY process, assertion_type
                 ORDER BY frequency DESC
                 LIMIT 20
-            """, (f'-{days} days',)).fetchall()
-            return [dict(row) for row in rows]
+            """, (f'-{days} days',))
+            return _fetch_dicts(cursor)
     
-    def get_drain_patterns(self) -> List[Dict[str, Any]]:
-        """Analyze battery drain patterns."""
+    def get_drain_patterns(self, days: int = 30) -> List[Dict[str, Any]]:
+        """Analyze battery drain patterns by hour of day from the drain rollup."""
         with self.get_connection() as conn:
-            rows = conn.execute("""
-                WITH consecutive AS (
-                    SELECT 
-                        *,
-                        LAG(percentage) OVER (ORDER BY timestamp) as prev_pct,
-                        LAG(timestamp) OVER (ORDER BY timestamp) as prev_ts,
-                        percentage - LAG(percentage) OVER (ORDER BY timestamp) as drain
-                    FROM snapshots
-                    WHERE is_charging = 0
-                )
+            cursor = conn.execute("""
                 SELECT 
-                    strftime('%H', timestamp) as hour,
-                    AVG(drain) as avg_drain_per_sample,
-                    AVG(wattage) as avg_wattage,
-                    AVG(cpu_usage_percent) as avg_cpu,
-                    COUNT(*) as samples
-                FROM consecutive
-                WHERE drain IS NOT NULL AND drain < 0
-                GROUP BY strftime('%H', timestamp)
+                    hour,
+                    SUM(drain_sum) / SUM(samples) as avg_drain_per_sample,
+                    SUM(wattage_sum) / SUM(wattage_samples) as avg_wattage,
+                    SUM(cpu_sum) / SUM(cpu_samples) as avg_cpu,
+                    SUM(samples) as samples
+                FROM drain_hourly
+                WHERE day >= DATE('now', ?)
+                GROUP BY hour
                 ORDER BY hour
-            """).fetchall()
-            return [dict(row) for row in rows]
+            """, (f'-{days} days',))
+            return _fetch_dicts(cursor)
     
-    def update_discharge_session(self, snapshot: Dict[str, Any]):
+    def update_discharge_session(self, snapshot: 'BatterySnapshot'):
         """Track discharge sessions for detailed drain analysis."""
-        with self.get_connection() as conn:
-            # Get active session
-            active = conn.execute(
-                "SELECT * FROM discharge_sessions WHERE is_active = 1"
-            ).fetchone()
-            
-            if snapshot['is_plugged_in'] or snapshot['is_charging']:
+        params = {
+            'timestamp': snapshot.timestamp,
+            'percentage': snapshot.percentage,
+        }
+        with self.get_connection(immediate=True) as conn:
+            if snapshot.is_plugged_in or snapshot.is_charging:
                 # End active session if plugged in
-                if active:
-                    start_time = datetime.fromisoformat(active['start_time'])
-                    duration = (
-                        datetime.fromisoformat(snapshot['timestamp']) - start_time
-                    ).total_seconds() / 60
-                    
-                    drain = active['start_percentage'] - snapshot['percentage']
-                    drain_rate = (drain / duration * 60) if duration > 0 else 0
-                    
-                    # Get averages from session
-                    avgs = conn.execute("""
-                        SELECT AVG(wattage) as avg_w, AVG(cpu_usage_percent) as avg_cpu
-                        FROM snapshots
-                        WHERE timestamp BETWEEN ? AND ?
-                    """, (active['start_time'], snapshot['timestamp'])).fetchone()
-                    
-                    conn.execute("""
-                        UPDATE discharge_sessions 
-                        SET end_time = ?, end_percentage = ?, duration_minutes = ?,
-                            drain_rate_per_hour = ?, avg_wattage = ?, avg_cpu_usage = ?,
-                            is_active = 0
-                        WHERE id = ?
-                    """, (
-                        snapshot['timestamp'], snapshot['percentage'],
-                        int(duration), round(drain_rate, 2),
-                        avgs['avg_w'], avgs['avg_cpu'], active['id']
-                    ))
+                conn.execute(_END_DISCHARGE_SESSION_SQL, params)
             else:
                 # Start new session or continue
-                if not active:
-                    conn.execute("""
-                        INSERT INTO discharge_sessions 
-                        (start_time, start_percentage)
-                        VALUES (?, ?)
-                    """, (snapshot['timestamp'], snapshot['percentage']))
+                conn.execute(_START_DISCHARGE_SESSION_SQL, params)
     
     def get_discharge_sessions(self, days: int = 30) -> List[Dict[str, Any]]:
         """Get completed discharge sessions."""
         with self.get_connection() as conn:
-            rows = conn.execute("""
+            cursor = conn.execute("""
                 SELECT * FROM discharge_sessions
                 WHERE is_active = 0
                 AND start_time >= DATE('now', ?)
                 ORDER BY start_time DESC
-            """, (f'-{days} days',)).fetchall()
-            return [dict(row) for row in rows]
+            """, (f'-{days} days',))
+            return _fetch_dicts(cursor)
     
     def get_summary_stats(self) -> Dict[str, Any]:
         """Get overall summary statistics."""
@@ -342,19 +658,39 @@ class BatteryDatabase:
             return dict(row) if row else {}
     
     def export_to_json(self, filepath: str, days: int = 30):
-        """Export data to JSON file."""
+        """
+        Export data to JSON file.
+        Snapshots are streamed in chunks so memory stays flat on large exports.
+        """
         data = {
             'summary': self.get_summary_stats(),
             'daily_stats': self.get_daily_stats(days),
-            'drain_patterns': self.get_drain_patterns(),
+            'drain_patterns': self.get_drain_patterns(days),
             'app_frequency': self.get_app_frequency(days),
             'power_assertions': self.get_power_assertion_stats(days),
             'discharge_sessions': self.get_discharge_sessions(days),
-            'snapshots': self.get_snapshots_last_hours(days * 24),
         }
+        end = datetime.now()
+        start = end - timedelta(days=days)
+        
+        # json.dumps(default=...) would build a new encoder for every row
+        encode = json.JSONEncoder(default=str).encode
         
-        with open(filepath, 'w') as f:
-            json.dump(data, f, indent=2, default=str)
+        with open(filepath, 'w', buffering=1 << 20) as f:
+            f.write('{\n')
+            for key, value in data.items():
+                f.write(f'  {encode(key)}: {encode(value)},\n')
+            
+            f.write('  "snapshots": [')
+            rows = map(encode, self.iter_snapshots_range(start, end))
+            separator = '\n    '
+            while True:
+                chunk = list(islice(rows, _EXPORT_CHUNK_ROWS))
+                if not chunk:
+                    break
+                f.write(separator + ',\n    '.join(chunk))
+                separator = ',\n    '
+            f.write('\n  ]\n}\n')
     
     def import_historical_snapshots(
         self,
@@ -365,69 +701,61 @@ class BatteryDatabase:
         Import historical snapshots from pmset log.
         Returns (imported_count, skipped_count).
         """
-        imported = 0
-        skipped = 0
-
-        with self.get_connection() as conn:
-            for event in events:
-                # Check for duplicate if requested
-                if avoid_duplicates:
-                    existing = conn.execute(
-                        "SELECT id FROM snapshots WHERE timestamp = ?",
-                        (event['timestamp'],)
-                    ).fetchone()
-                    if existing:
-                        skipped += 1
-                        continue
+        # Imported events only carry charge state; other metrics stay NULL
+        if avoid_duplicates:
+            sql = """
+                INSERT INTO snapshots (
+                    timestamp, percentage, is_charging, is_plugged_in
+                )
+                SELECT ?, ?, ?, ?
+                WHERE NOT EXISTS (SELECT 1 FROM snapshots WHERE timestamp = ?)
+            """
+            event_row = operator.itemgetter(
+                'timestamp', 'percentage', 'is_charging', 'is_plugged_in',
+                'timestamp'
+            )
+        else:
+            sql = """
+                INSERT INTO snapshots (
+                    timestamp, percentage, is_charging, is_plugged_in
+                ) VALUES (?, ?, ?, ?)
+            """
+            event_row = operator.itemgetter(
+                'timestamp', 'percentage', 'is_charging', 'is_plugged_in'
+            )
+        rows = map(event_row, events)
 
-                # Insert with partial data (no wattage, temp, apps, etc.)
-                conn.execute("""
-                    INSERT INTO snapshots (
-                        timestamp, percentage, is_charging, is_plugged_in,
-                        time_remaining_minutes, cycle_count, design_capacity_mah,
-                        max_capacity_mah, current_capacity_mah, health_percentage,
-                        voltage_mv, amperage_ma, wattage, temperature_celsius,
-                        cpu_usage_percent, display_brightness
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    event['timestamp'],
-                    event['percentage'],
-                    int(event['is_charging']),
-                    int(event['is_plugged_in']),
-                    None,  # time_remaining_minutes
-                    None,  # cycle_count
-                    None,  # design_capacity_mah
-                    None,  # max_capacity_mah
-                    None,  # current_capacity_mah
-                    None,  # health_percentage
-                    None,  # voltage_mv
-                    None,  # amperage_ma
-                    None,  # wattage
-                    None,  # temperature_celsius
-                    None,  # cpu_usage_percent
-                    None,  # display_brightness
-                ))
-                imported += 1
+        with self.get_connection(immediate=True) as conn:
+            imported = conn.executemany(sql, rows).rowcount
+            # History lands before newer rows, so pair drains afresh
+            if imported:
+                self._rebuild_drain_hourly(conn)
+        skipped = len(events) - imported
 
         return imported, skipped
 
     def cleanup_old_data(self, days_to_keep: int = 90):
         """Remove data older than specified days."""
-        with self.get_connection() as conn:
-            cutoff = (datetime.now() - timedelta(days=days_to_keep)).isoformat()
-            conn.execute(
-                "DELETE FROM power_assertions WHERE snapshot_id IN "
-                "(SELECT id FROM snapshots WHERE timestamp < ?)",
-                (cutoff,)
-            )
-            conn.execute(
-                "DELETE FROM active_apps WHERE snapshot_id IN "
-                "(SELECT id FROM snapshots WHERE timestamp < ?)",
-                (cutoff,)
-            )
+        with self.get_connection(immediate=True) as conn:
+            # Prune whole days so every table shares one boundary
+            cutoff = (date.today() - timedelta(days=days_to_keep)).isoformat()
+            # trg_snapshots_delete_children removes apps and assertions
             conn.execute("DELETE FROM snapshots WHERE timestamp < ?", (cutoff,))
             conn.execute("DELETE FROM discharge_sessions WHERE start_time < ?", (cutoff,))
-            conn.execute("VACUUM")
+            # The cutoff day lost its first drain pairing, and offset
+            # timestamps may have left partial UTC hour buckets
+            recompute_before = (date.fromisoformat(cutoff) + timedelta(days=1)).isoformat()
+            self._rebuild_snapshots_hourly(conn, recompute_before)
+            self._rebuild_drain_hourly(conn, recompute_before)
+        
+        # Space reclamation cannot run inside the transaction above
+        with self._lock:
+            if self._conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                # executescript() steps the pragma until every page is freed
+                self._conn.executescript("PRAGMA incremental_vacuum;")
+            else:
+                # One full rebuild switches older files to incremental mode
+                self._conn.execute("VACUUM")
 
 
 if __name__ == "__main__":